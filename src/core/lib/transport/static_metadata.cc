@@ -1194,53 +1194,45 @@ uintptr_t grpc_static_mdelem_user_data[GRPC_STATIC_MDELEM_COUNT] = {
     0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
     0, 0, 0, 0, 0, 0, 0, 0, 0, 2, 4, 4, 6, 6, 8, 8, 2, 4, 4};
 
-static const int8_t elems_r[] = {
-    15, 10, -8,  0,  2,   -43, -83, -44, 0,  4,  -8, 0,  0,  0,  10, 0,  -7, 0,
-    0,  3,  3,   0,  0,   0,   0,   0,   0,  0,  0,  0,  0,  0,  0,  0,  0,  0,
-    0,  0,  0,   0,  0,   0,   0,   0,   0,  0,  0,  0,  0,  0,  0,  0,  0,  0,
-    0,  0,  -68, 0,  -53, -56, -53, -77, 0,  30, 29, 28, 27, 26, 25, 24, 35, 22,
-    21, 20, 19,  18, 17,  16,  15,  16,  16, 16, 15, 14, 13, 12, 11, 10, 9,  8,
-    7,  6,  5,   4,  3,   2,   3,   2,   2,  6,  0,  0,  0,  0,  0,  0,  -7, 0};
+static const uint8_t empty_value_elem_idxs[] = {
+    255, 255, 255, 0,   255, 255, 255, 255, 255, 255, 255, 255, 255, 255,
+    30,  25,  71,  255, 255, 57,  37,  255, 255, 255, 255, 255, 255, 255,
+    255, 255, 255, 255, 255, 255, 255, 255, 255, 255, 255, 255, 255, 255,
+    255, 255, 255, 255, 255, 255, 255, 255, 255, 255, 255, 255, 255, 255,
+    14,  255, 16,  17,  18,  19,  20,  21,  22,  23,  24,  26,  27,  28,
+    29,  31,  32,  33,  34,  35,  36,  38,  39,  40,  41,  42,  43,  44,
+    45,  46,  47,  48,  49,  50,  51,  52,  53,  54,  55,  56,  58,  59,
+    60,  255, 255, 255, 255, 255, 255, 74,  255, 255, 255, 255};
+
+static const uint8_t elems_pilots[] = {0, 0, 2, 3, 0, 3, 25, 0, 1, 0,  1,
+                                       0, 0, 5, 0, 2, 0, 0,  1, 4, 10, 22,
+                                       0, 0, 0, 0, 0, 6, 0,  0, 0, 6};
 static uint32_t elems_phash(uint32_t i) {
-  i -= 45;
-  uint32_t x = i % 108;
-  uint32_t y = i / 108;
-  uint32_t h = x;
-  if (y < GPR_ARRAY_SIZE(elems_r)) {
-    uint32_t delta = static_cast<uint32_t>(elems_r[y]);
-    h += delta;
-  }
-  return h;
+  uint32_t x = i * 0x9E3779B1u;
+  return (x ^ elems_pilots[x >> 27]) % 36;
 }
 
 static const uint16_t elem_keys[] = {
-    269,   270,   271,   272,   273,   274,  275,   1140, 1141,  1789,  153,
-    154,   487,   488,   1679,  45,    46,   1030,  1031, 795,   796,   1801,
-    1569,  651,   869,   2119,  1691,  2229, 6189,  6739, 6849,  6959,  7069,
-    7179,  7289,  7399,  7509,  1817,  7729, 7839,  7949, 8059,  8169,  8279,
-    8389,  8499,  6519,  6409,  8609,  7619, 8719,  6629, 8829,  8939,  9049,
-    9159,  9269,  9379,  9489,  9599,  9709, 9819,  9929, 10039, 10149, 10259,
-    10369, 1200,  543,   10479, 10589, 214,  10699, 1206, 1207,  1208,  1209,
-    1090,  10809, 11579, 1860,  0,     0,    0,     0,    1750,  0,     1867,
-    0,     0,     359,   0,     0,     0,    0,     1642};
+    1860, 1208, 1141, 1801, 1691, 1817, 1750, 275, 796, 45,  1200, 272,
+    269,  154,  651,  1207, 1140, 1867, 795,  274, 488, 271, 1642, 1030,
+    1090, 487,  1206, 46,   1209, 153,  543,  869, 270, 273, 1031, 214};
 static const uint8_t elem_idxs[] = {
-    7,  8,   9,   10,  11,  12, 13,  76, 78,  71,  1,  2,   5,   6,   25,  3,
-    4,  66,  65,  62,  63,  83, 30,  67, 61,  57,  73, 37,  14,  19,  20,  21,
-    22, 23,  24,  26,  27,  15, 29,  31, 32,  33,  34, 35,  36,  38,  17,  16,
-    39, 28,  40,  18,  41,  42, 43,  44, 45,  46,  47, 48,  49,  50,  51,  52,
-    53, 54,  55,  75,  69,  56, 58,  70, 59,  77,  79, 80,  81,  64,  60,  74,
-    82, 255, 255, 255, 255, 72, 255, 84, 255, 255, 0,  255, 255, 255, 255, 68};
+    82, 80, 78, 83, 73, 15, 72, 13, 63, 3, 75, 10, 7,  2,  67, 79, 76, 84,
+    62, 12, 6,  9,  68, 66, 64, 5,  77, 4, 81, 1,  69, 61, 8,  11, 65, 70};
 
 grpc_mdelem grpc_static_mdelem_for_static_strings(intptr_t a, intptr_t b) {
   if (a == -1 || b == -1) return GRPC_MDNULL;
-  uint32_t k = static_cast<uint32_t>(a * 110 + b);
-  uint32_t h = elems_phash(k);
-  return h < GPR_ARRAY_SIZE(elem_keys) && elem_keys[h] == k &&
-                 elem_idxs[h] != 255
-             ? GRPC_MAKE_MDELEM(
-                   &grpc_static_mdelem_table()[elem_idxs[h]].data(),
-                   GRPC_MDELEM_STORAGE_STATIC)
-             : GRPC_MDNULL;
+  uint8_t idx;
+  if (b == 29) {
+    idx = empty_value_elem_idxs[a];
+  } else {
+    uint32_t k = static_cast<uint32_t>(a * 110 + b);
+    uint32_t h = elems_phash(k);
+    idx = elem_keys[h] == k ? elem_idxs[h] : 255;
+  }
+  return idx != 255 ? GRPC_MAKE_MDELEM(&grpc_static_mdelem_table()[idx].data(),
+                                       GRPC_MDELEM_STORAGE_STATIC)
+                    : GRPC_MDNULL;
 }
 
 const uint8_t grpc_static_accept_encoding_metadata[8] = {0,  75, 76, 77,
@@ -1,4 +1,4 @@
-#!/usr/bin/env python2.7
+#!/usr/bin/env python3
 
 # Copyright 2015 gRPC authors.
 #
@@ -17,12 +17,14 @@
 import collections
 import hashlib
 import itertools
+import json
+import math
 import os
 import re
 import subprocess
 import sys
-
-import perfection
+import tempfile
+import zlib
 
 # Configuration: a list of either strings or 2-tuples of strings.
 # A single string represents a static grpc_mdstr.
@@ -194,39 +196,28 @@ STREAM_COMPRESSION_ALGORITHMS = [
     'gzip',
 ]
 
+# when mangling, punctuation is replaced by a word or an underscore, then runs
+# of underscores are collapsed and leading/trailing underscores dropped
+MANGLE_TRANSLATION = str.maketrans({
+    '-': '_',
+    ':': '',
+    '/': '_slash_',
+    '.': '_dot_',
+    ',': '_comma_',
+    ' ': '_',
+})
+MANGLE_UNDERSCORE_RUN = re.compile('_+')
+
 
 # utility: mangle the name of a config
 def mangle(elem, name=None):
-    xl = {
-        '-': '_',
-        ':': '',
-        '/': 'slash',
-        '.': 'dot',
-        ',': 'comma',
-        ' ': '_',
-    }
 
     def m0(x):
         if not x:
             return 'empty'
-        r = ''
-        for c in x:
-            put = xl.get(c, c.lower())
-            if not put:
-                continue
-            last_is_underscore = r[-1] == '_' if r else True
-            if last_is_underscore and put == '_':
-                continue
-            elif len(put) > 1:
-                if not last_is_underscore:
-                    r += '_'
-                r += put
-                r += '_'
-            else:
-                r += put
-        if r[-1] == '_':
-            r = r[:-1]
-        return r
+        return MANGLE_UNDERSCORE_RUN.sub(
+            '_',
+            x.lower().translate(MANGLE_TRANSLATION)).strip('_')
 
     def n(default, name=name):
         if name is None:
@@ -243,124 +234,126 @@ def mangle(elem, name=None):
 
 # utility: generate some hash value for a string
 def fake_hash(elem):
-    return hashlib.md5(elem).hexdigest()[0:8]
+    return '%08x' % (zlib.crc32(elem.encode('utf-8')) & 0xffffffff)
+
+
+# utility: append a line of output to a buffer
+def emit(buf, line=''):
+    buf.append(line + '\n')
 
 
 # utility: print a big comment block into a set of files
 def put_banner(files, banner):
     for f in files:
-        print >> f, '/*'
+        emit(f, '/*')
         for line in banner:
-            print >> f, ' * %s' % line
-        print >> f, ' */'
-        print >> f
+            emit(f, ' * %s' % line)
+        emit(f, ' */')
+        emit(f)
 
 
 # build a list of all the strings we need
 all_strs = list()
 all_elems = list()
+# companion sets for O(1) membership tests while building the lists above
+all_strs_set = set()
+all_elems_set = set()
 static_userdata = {}
+
+
+def add_str(s):
+    if s not in all_strs_set:
+        all_strs_set.add(s)
+        all_strs.append(s)
+
+
+def add_elem(e):
+    if e not in all_elems_set:
+        all_elems_set.add(e)
+        all_elems.append(e)
+
+
 # put metadata batch callouts first, to make the check of if a static metadata
 # string is a callout trivial
 for elem in METADATA_BATCH_CALLOUTS:
-    if elem not in all_strs:
-        all_strs.append(elem)
+    add_str(elem)
 for elem in CONFIG:
     if isinstance(elem, tuple):
-        if elem[0] not in all_strs:
-            all_strs.append(elem[0])
-        if elem[1] not in all_strs:
-            all_strs.append(elem[1])
-        if elem not in all_elems:
-            all_elems.append(elem)
+        add_str(elem[0])
+        add_str(elem[1])
+        add_elem(elem)
     else:
-        if elem not in all_strs:
-            all_strs.append(elem)
-compression_elems = []
-for mask in range(1, 1 << len(COMPRESSION_ALGORITHMS)):
-    val = ','.join(COMPRESSION_ALGORITHMS[alg]
-                   for alg in range(0, len(COMPRESSION_ALGORITHMS))
-                   if (1 << alg) & mask)
-    elem = ('grpc-accept-encoding', val)
-    if val not in all_strs:
-        all_strs.append(val)
-    if elem not in all_elems:
-        all_elems.append(elem)
-    compression_elems.append(elem)
-    static_userdata[elem] = 1 + (mask | 1)
-stream_compression_elems = []
-for mask in range(1, 1 << len(STREAM_COMPRESSION_ALGORITHMS)):
-    val = ','.join(STREAM_COMPRESSION_ALGORITHMS[alg]
-                   for alg in range(0, len(STREAM_COMPRESSION_ALGORITHMS))
-                   if (1 << alg) & mask)
-    elem = ('accept-encoding', val)
-    if val not in all_strs:
-        all_strs.append(val)
-    if elem not in all_elems:
-        all_elems.append(elem)
-    stream_compression_elems.append(elem)
-    static_userdata[elem] = 1 + (mask | 1)
-
-# output configuration
+        add_str(elem)
+
+
+# add the accept-encoding style elements for every non-empty combination of
+# algs under header, returning them indexed by (bitmask of algs) - 1
+def build_compression_elems(algs, header):
+    # comma separated names of the algorithms set in each bitmask
+    vals = [
+        ','.join(alg
+                 for i, alg in enumerate(algs)
+                 if mask >> i & 1)
+        for mask in range(1 << len(algs))
+    ]
+    elems = []
+    # mask 0 (no algorithms) gets no element
+    for mask, val in enumerate(vals[1:], 1):
+        elem = (header, val)
+        add_str(val)
+        add_elem(elem)
+        elems.append(elem)
+        static_userdata[elem] = 1 + (mask | 1)
+    return elems
+
+
+compression_elems = build_compression_elems(COMPRESSION_ALGORITHMS,
+                                            'grpc-accept-encoding')
+stream_compression_elems = build_compression_elems(
+    STREAM_COMPRESSION_ALGORITHMS, 'accept-encoding')
+
+# index lookups into the (now final) lists of strings and elements
+str_to_idx = {s: i for i, s in enumerate(all_strs)}
+elem_to_idx = {e: i for i, e in enumerate(all_elems)}
+
+# mangled (upper case) names of the strings and elements, computed once
+mangled_str = {s: mangle(s).upper() for s in all_strs}
+mangled_elem = {e: mangle(e).upper() for e in all_elems}
+
+# output configuration: generated lines are buffered per output file and
+# written out in one go at the end
 args = sys.argv[1:]
-H = None
-C = None
-D = None
-if args:
-    if 'header' in args:
-        H = sys.stdout
-    else:
-        H = open('/dev/null', 'w')
-    if 'source' in args:
-        C = sys.stdout
-    else:
-        C = open('/dev/null', 'w')
-    if 'dictionary' in args:
-        D = sys.stdout
-    else:
-        D = open('/dev/null', 'w')
-else:
-    H = open(
-        os.path.join(os.path.dirname(sys.argv[0]),
-                     '../../../src/core/lib/transport/static_metadata.h'), 'w')
-    C = open(
-        os.path.join(os.path.dirname(sys.argv[0]),
-                     '../../../src/core/lib/transport/static_metadata.cc'), 'w')
-    D = open(
-        os.path.join(os.path.dirname(sys.argv[0]),
-                     '../../../test/core/end2end/fuzzers/hpack.dictionary'),
-        'w')
-
-# copy-paste copyright notice from this file
-with open(sys.argv[0]) as my_source:
-    copyright = []
-    for line in my_source:
-        if line[0] != '#':
-            break
-    for line in my_source:
-        if line[0] == '#':
-            copyright.append(line)
-            break
-    for line in my_source:
-        if line[0] != '#':
-            break
-        copyright.append(line)
-    put_banner([H, C], [line[2:].rstrip() for line in copyright])
+H = []
+C = []
+D = []
+
+# copy-paste copyright notice from this file: the first block of comment lines
+# after the shebang block
+with open(sys.argv[0], encoding='utf-8') as my_source:
+    my_lines = my_source.read().splitlines()
+copyright_start = next(
+    i for i, line in enumerate(my_lines) if not line.startswith('#'))
+copyright_start = next(i for i in range(copyright_start, len(my_lines))
+                       if my_lines[i].startswith('#'))
+copyright_end = next((i for i in range(copyright_start, len(my_lines))
+                      if not my_lines[i].startswith('#')), len(my_lines))
+copyright = my_lines[copyright_start:copyright_end]
+put_banner([H, C], [line[2:].rstrip() for line in copyright])
 
 hex_bytes = [ord(c) for c in 'abcdefABCDEF0123456789']
 
+# decimal representation of every byte value, for emitting byte arrays
+BYTE_STR = [str(i) for i in range(256)]
+
+# escaped representation of every byte value, for the fuzzing dictionary
+ESC_DICT_STR = [
+    '\\"' if i == ord('"') else chr(i) if 32 <= i < 127 else '\\x%02X' % i
+    for i in range(256)
+]
+
 
 def esc_dict(line):
-    out = "\""
-    for c in line:
-        if 32 <= c < 127:
-            if c != ord('"'):
-                out += chr(c)
-            else:
-                out += "\\\""
-        else:
-            out += '\\x%02X' % c
-    return out + "\""
+    return '"' + ''.join(ESC_DICT_STR[c] for c in line) + '"'
 
 
 put_banner([H, C], """WARNING: Auto-generated code.
@@ -372,57 +365,56 @@ See metadata.h for an explanation of the interface here, and metadata.cc for
 an explanation of what's going on.
 """.splitlines())
 
-print >> H, '#ifndef GRPC_CORE_LIB_TRANSPORT_STATIC_METADATA_H'
-print >> H, '#define GRPC_CORE_LIB_TRANSPORT_STATIC_METADATA_H'
-print >> H
-print >> H, '#include <grpc/support/port_platform.h>'
-print >> H
-print >> H, '#include <cstdint>'
-print >> H
-print >> H, '#include "src/core/lib/transport/metadata.h"'
-print >> H
-print >> C, '#include <grpc/support/port_platform.h>'
-print >> C
-print >> C, '#include "src/core/lib/transport/static_metadata.h"'
-print >> C
-print >> C, '#include "src/core/lib/slice/slice_internal.h"'
-print >> C
-
-str_ofs = 0
-id2strofs = {}
-for i, elem in enumerate(all_strs):
-    id2strofs[i] = str_ofs
-    str_ofs += len(elem)
+emit(H, '#ifndef GRPC_CORE_LIB_TRANSPORT_STATIC_METADATA_H')
+emit(H, '#define GRPC_CORE_LIB_TRANSPORT_STATIC_METADATA_H')
+emit(H)
+emit(H, '#include <grpc/support/port_platform.h>')
+emit(H)
+emit(H, '#include <cstdint>')
+emit(H)
+emit(H, '#include "src/core/lib/transport/metadata.h"')
+emit(H)
+emit(C, '#include <grpc/support/port_platform.h>')
+emit(C)
+emit(C, '#include "src/core/lib/transport/static_metadata.h"')
+emit(C)
+emit(C, '#include "src/core/lib/slice/slice_internal.h"')
+emit(C)
+
+# length and offset into g_bytes of each static string, indexed like all_strs
+str_lens = [len(elem) for elem in all_strs]
+str_offsets = [0] + list(itertools.accumulate(str_lens[:-1]))
 
 
 def slice_def_for_ctx(i):
     return (
         'grpc_core::StaticMetadataSlice(&refcounts[%d].base, %d, g_bytes+%d)'
-    ) % (i, len(all_strs[i]), id2strofs[i])
+    ) % (i, str_lens[i], str_offsets[i])
 
 
 def slice_def(i):
     return (
         'grpc_core::StaticMetadataSlice(&grpc_static_metadata_refcounts()[%d].base, %d, g_bytes+%d)'
-    ) % (i, len(all_strs[i]), id2strofs[i])
+    ) % (i, str_lens[i], str_offsets[i])
 
 
 def str_idx(s):
-    for i, s2 in enumerate(all_strs):
-        if s == s2:
-            return i
+    return str_to_idx[s]
 
 
 # validate configuration
-for elem in METADATA_BATCH_CALLOUTS:
-    assert elem in all_strs
+missing_callouts = [
+    elem for elem in METADATA_BATCH_CALLOUTS if elem not in all_strs_set
+]
+assert not missing_callouts, missing_callouts
 static_slice_dest_assert = (
     'static_assert(std::is_trivially_destructible' +
     '<grpc_core::StaticMetadataSlice>::value, '
     '"grpc_core::StaticMetadataSlice must be trivially destructible.");')
-print >> H, static_slice_dest_assert
-print >> H, '#define GRPC_STATIC_MDSTR_COUNT %d' % len(all_strs)
-print >> H, '''
+emit(H, static_slice_dest_assert)
+emit(H, '#define GRPC_STATIC_MDSTR_COUNT %d' % len(all_strs))
+emit(
+    H, '''
 void grpc_init_static_metadata_ctx(void);
 void grpc_destroy_static_metadata_ctx(void);
 namespace grpc_core {
@@ -438,16 +430,18 @@ inline const grpc_core::StaticMetadataSlice* grpc_static_slice_table() {
   GPR_DEBUG_ASSERT(grpc_core::g_static_metadata_slice_table != nullptr);
   return grpc_core::g_static_metadata_slice_table;
 }
-'''
+''')
 for i, elem in enumerate(all_strs):
-    print >> H, '/* "%s" */' % elem
-    print >> H, '#define %s (grpc_static_slice_table()[%d])' % (
-        mangle(elem).upper(), i)
-print >> H
-print >> C, 'static constexpr uint8_t g_bytes[] = {%s};' % (','.join(
-    '%d' % ord(c) for c in ''.join(all_strs)))
-print >> C
-print >> H, '''
+    emit(H, '/* "%s" */' % elem)
+    emit(H,
+         '#define %s (grpc_static_slice_table()[%d])' % (mangled_str[elem], i))
+emit(H)
+emit(
+    C, 'static constexpr uint8_t g_bytes[] = {%s};' %
+    ','.join(BYTE_STR[b] for b in ''.join(all_strs).encode('latin1')))
+emit(C)
+emit(
+    H, '''
 namespace grpc_core {
 struct StaticSliceRefcount;
 extern StaticSliceRefcount* g_static_metadata_slice_refcounts;
@@ -458,9 +452,11 @@ inline grpc_core::StaticSliceRefcount* grpc_static_metadata_refcounts() {
   GPR_DEBUG_ASSERT(grpc_core::g_static_metadata_slice_refcounts != nullptr);
   return grpc_core::g_static_metadata_slice_refcounts;
 }
-'''
-print >> C, 'grpc_slice_refcount grpc_core::StaticSliceRefcount::kStaticSubRefcount;'
-print >> C, '''
+''')
+emit(C,
+     'grpc_slice_refcount grpc_core::StaticSliceRefcount::kStaticSubRefcount;')
+emit(
+    C, '''
 namespace grpc_core {
 struct StaticMetadataCtx {
 #ifndef NDEBUG
@@ -468,49 +464,52 @@ struct StaticMetadataCtx {
 #endif
   StaticSliceRefcount
     refcounts[GRPC_STATIC_MDSTR_COUNT] = {
-'''
-for i, elem in enumerate(all_strs):
-    print >> C, '  StaticSliceRefcount(%d), ' % i
-print >> C, '};'  # static slice refcounts
-print >> C
-print >> C, '''
+''')
+emit(C,
+     '\n'.join('  StaticSliceRefcount(%d), ' % i for i in range(len(all_strs))))
+emit(C, '};')  # static slice refcounts
+emit(C)
+emit(
+    C, '''
   const StaticMetadataSlice
     slices[GRPC_STATIC_MDSTR_COUNT] = {
-'''
-for i, elem in enumerate(all_strs):
-    print >> C, slice_def_for_ctx(i) + ','
-print >> C, '};'  # static slices
-print >> C, 'StaticMetadata static_mdelem_table[GRPC_STATIC_MDELEM_COUNT] = {'
+''')
+emit(C, '\n'.join(slice_def_for_ctx(i) + ',' for i in range(len(all_strs))))
+emit(C, '};')  # static slices
+emit(C, 'StaticMetadata static_mdelem_table[GRPC_STATIC_MDELEM_COUNT] = {')
 for idx, (a, b) in enumerate(all_elems):
-    print >> C, 'StaticMetadata(%s,%s, %d),' % (slice_def_for_ctx(
-        str_idx(a)), slice_def_for_ctx(str_idx(b)), idx)
-print >> C, '};'  # static_mdelem_table
-print >> C, ('''
+    emit(
+        C, 'StaticMetadata(%s,%s, %d),' %
+        (slice_def_for_ctx(str_idx(a)), slice_def_for_ctx(str_idx(b)), idx))
+emit(C, '};')  # static_mdelem_table
+emit(C, ('''
 /* Warning: the core static metadata currently operates under the soft constraint
 that the first GRPC_CHTTP2_LAST_STATIC_ENTRY (61) entries must contain
 metadata specified by the http2 hpack standard. The CHTTP2 transport reads the
 core metadata with this assumption in mind. If the order of the core static
 metadata is to be changed, then the CHTTP2 transport must be changed as well to
 stop relying on the core metadata. */
-''')
-print >> C, ('grpc_mdelem '
-             'static_mdelem_manifested[GRPC_STATIC_MDELEM_COUNT] = {')
-print >> C, '// clang-format off'
-static_mds = []
-for i, elem in enumerate(all_elems):
-    md_name = mangle(elem).upper()
-    md_human_readable = '"%s": "%s"' % elem
-    md_spec = '    /* %s: \n     %s */\n' % (md_name, md_human_readable)
-    md_spec += '    GRPC_MAKE_MDELEM(\n'
-    md_spec += (('        &static_mdelem_table[%d].data(),\n' % i) +
-                '        GRPC_MDELEM_STORAGE_STATIC)')
-    static_mds.append(md_spec)
-print >> C, ',\n'.join(static_mds)
-print >> C, '// clang-format on'
-print >> C, ('};')  # static_mdelem_manifested
-print >> C, '};'  # struct StaticMetadataCtx
-print >> C, '}'  # namespace grpc_core
-print >> C, '''
+'''))
+emit(C, ('grpc_mdelem '
+         'static_mdelem_manifested[GRPC_STATIC_MDELEM_COUNT] = {'))
+emit(C, '// clang-format off')
+static_md_template = ('    /* %(name)s: \n     "%(key)s": "%(value)s" */\n'
+                      '    GRPC_MAKE_MDELEM(\n'
+                      '        &static_mdelem_table[%(idx)d].data(),\n'
+                      '        GRPC_MDELEM_STORAGE_STATIC)')
+emit(
+    C, ',\n'.join(static_md_template % {
+        'name': mangled_elem[elem],
+        'key': elem[0],
+        'value': elem[1],
+        'idx': i
+    } for i, elem in enumerate(all_elems)))
+emit(C, '// clang-format on')
+emit(C, ('};'))  # static_mdelem_manifested
+emit(C, '};')  # struct StaticMetadataCtx
+emit(C, '}')  # namespace grpc_core
+emit(
+    C, '''
 namespace grpc_core {
 static StaticMetadataCtx* g_static_metadata_slice_ctx = nullptr;
 const StaticMetadataSlice* g_static_metadata_slice_table = nullptr;
@@ -546,27 +545,32 @@ void grpc_destroy_static_metadata_ctx(void) {
   grpc_core::g_static_mdelem_manifested = nullptr;
 }
 
-'''
-
-print >> C
-print >> H, '#define GRPC_IS_STATIC_METADATA_STRING(slice) \\'
-print >> H, ('  ((slice).refcount != NULL && (slice).refcount->GetType() == '
-             'grpc_slice_refcount::Type::STATIC)')
-print >> H
-print >> C
-print >> H, '#define GRPC_STATIC_METADATA_INDEX(static_slice) \\'
-print >> H, '(reinterpret_cast<grpc_core::StaticSliceRefcount*>((static_slice).refcount)->index)'
-print >> H
+''')
 
-print >> D, '# hpack fuzzing dictionary'
+emit(C)
+emit(H, '#define GRPC_IS_STATIC_METADATA_STRING(slice) \\')
+emit(H, ('  ((slice).refcount != NULL && (slice).refcount->GetType() == '
+         'grpc_slice_refcount::Type::STATIC)'))
+emit(H)
+emit(C)
+emit(H, '#define GRPC_STATIC_METADATA_INDEX(static_slice) \\')
+emit(
+    H,
+    '(reinterpret_cast<grpc_core::StaticSliceRefcount*>((static_slice).refcount)->index)'
+)
+emit(H)
+
+emit(D, '# hpack fuzzing dictionary')
 for i, elem in enumerate(all_strs):
-    print >> D, '%s' % (esc_dict([len(elem)] + [ord(c) for c in elem]))
+    emit(D, '%s' % (esc_dict([len(elem)] + [ord(c) for c in elem])))
 for i, elem in enumerate(all_elems):
-    print >> D, '%s' % (esc_dict([0, len(elem[0])] + [ord(c) for c in elem[0]] +
-                                 [len(elem[1])] + [ord(c) for c in elem[1]]))
+    emit(
+        D, '%s' % (esc_dict([0, len(elem[0])] + [ord(c) for c in elem[0]] +
+                            [len(elem[1])] + [ord(c) for c in elem[1]])))
 
-print >> H, '#define GRPC_STATIC_MDELEM_COUNT %d' % len(all_elems)
-print >> H, '''
+emit(H, '#define GRPC_STATIC_MDELEM_COUNT %d' % len(all_elems))
+emit(
+    H, '''
 namespace grpc_core {
 extern StaticMetadata* g_static_mdelem_table;
 extern grpc_mdelem* g_static_mdelem_manifested;
@@ -583,118 +587,256 @@ inline grpc_mdelem* grpc_static_mdelem_manifested() {
   GPR_DEBUG_ASSERT(grpc_core::g_static_mdelem_manifested != nullptr);
   return grpc_core::g_static_mdelem_manifested;
 }
-'''
-print >> H, ('extern uintptr_t '
-             'grpc_static_mdelem_user_data[GRPC_STATIC_MDELEM_COUNT];')
+''')
+emit(H, ('extern uintptr_t '
+         'grpc_static_mdelem_user_data[GRPC_STATIC_MDELEM_COUNT];'))
 
 for i, elem in enumerate(all_elems):
-    md_name = mangle(elem).upper()
-    print >> H, '/* "%s": "%s" */' % elem
-    print >> H, ('#define %s (grpc_static_mdelem_manifested()[%d])' %
-                 (md_name, i))
-print >> H
+    md_name = mangled_elem[elem]
+    emit(H, '/* "%s": "%s" */' % elem)
+    emit(H, ('#define %s (grpc_static_mdelem_manifested()[%d])' % (md_name, i)))
+emit(H)
 
-print >> C, ('uintptr_t grpc_static_mdelem_user_data[GRPC_STATIC_MDELEM_COUNT] '
-             '= {')
-print >> C, '  %s' % ','.join(
-    '%d' % static_userdata.get(elem, 0) for elem in all_elems)
-print >> C, '};'
-print >> C
+emit(C, ('uintptr_t grpc_static_mdelem_user_data[GRPC_STATIC_MDELEM_COUNT] '
+         '= {'))
+emit(
+    C, '  %s' %
+    ','.join('%d' % static_userdata.get(elem, 0) for elem in all_elems))
+emit(C, '};')
+emit(C)
 
 
 def md_idx(m):
-    for i, m2 in enumerate(all_elems):
-        if m == m2:
-            return i
-
-
-def offset_trials(mink):
-    yield 0
-    for i in range(1, 100):
-        for mul in [-1, 1]:
-            yield mul * i
+    return elem_to_idx[m]
+
+
+# search a pilot per bucket so that every key lands in its own slot, returning
+# None if some bucket has no valid pilot for this seed
+def perfect_hash_pilots(keys, seed, bucket_bits):
+    n = len(keys)
+    buckets = collections.defaultdict(list)
+    for k in keys:
+        x = (k * seed) & 0xffffffff
+        buckets[x >> (32 - bucket_bits)].append(x)
+    pilots = [0] * (1 << bucket_bits)
+    taken = set()
+    # place the largest buckets first, while most of the table is still free
+    for bucket, xs in sorted(buckets.items(),
+                             key=lambda item: (-len(item[1]), item[0])):
+        for pilot in range(1 << 16):
+            slots = set((x ^ pilot) % n for x in xs)
+            if len(slots) == len(xs) and not slots & taken:
+                break
+        else:
+            return None
+        pilots[bucket] = pilot
+        taken |= slots
+    return pilots
+
+
+# search for PTHash style minimal perfect hash parameters over keys: a key is
+# multiplied by a 32 bit seed, the top bits of the product select a bucket, and
+# the product xor'ed with that bucket's pilot, modulo the number of keys, gives
+# its slot
+def search_perfect_hash_params(keys, name):
+    bucket_bits = perfect_hash_bucket_bits(keys, name)
+    for attempt in range(1000):
+        seed = (0x9E3779B1 + 2 * attempt) & 0xffffffff
+        pilots = perfect_hash_pilots(keys, seed, bucket_bits)
+        if pilots is not None:
+            return {'seed': seed, 'bucket_bits': bucket_bits, 'pilots': pilots}
+    raise Exception('unable to build a perfect hash for %s' % name)
+
+
+# about 4n/log2(n) buckets, rounded up to a power of two so that the bucket is
+# just the high bits of the product
+def perfect_hash_bucket_bits(keys, name):
+    n = len(keys)
+    if not n:
+        raise Exception('no keys to build a perfect hash for %s' % name)
+    return max(1, int(math.ceil(math.log(4.0 * n / math.log(max(n, 2), 2), 2))))
+
+
+# the slot function described by perfect hash parameters over n keys
+def perfect_hash_func(params, n):
+    seed = params['seed']
+    pilots = params['pilots']
+    shift = 32 - params['bucket_bits']
+
+    def f(i):
+        x = (i * seed) & 0xffffffff
+        return (x ^ pilots[x >> shift]) % n
+
+    return f
+
+
+# check that params loaded from the cache have the shape
+# search_perfect_hash_params produces and map keys one-to-one onto their slots
+def valid_perfect_hash_params(keys, name, params):
+    if not isinstance(params, dict):
+        return False
+    seed = params.get('seed')
+    bucket_bits = params.get('bucket_bits')
+    pilots = params.get('pilots')
+    if type(seed) is not int or not 0 <= seed <= 0xffffffff:
+        return False
+    if type(bucket_bits) is not int:
+        return False
+    if bucket_bits != perfect_hash_bucket_bits(keys, name):
+        return False
+    if not isinstance(pilots, list) or len(pilots) != 1 << bucket_bits:
+        return False
+    if not all(type(p) is int and 0 <= p < 1 << 16 for p in pilots):
+        return False
+    f = perfect_hash_func(params, len(keys))
+    return sorted(map(f, keys)) == list(range(len(keys)))
+
+
+# the perfect hash parameters are a pure function of the keys, so they can be
+# cached across runs to skip the search when regenerating unchanged metadata.
+# The cache lives in the shared temp directory and any valid entry is used
+# even if a fresh search would pick other parameters, so it is only enabled
+# when GRPC_GEN_STATIC_METADATA_CACHE=1 is set in the environment.
+PERFECT_HASH_CACHE_VERSION = 1
+
+
+def cached_perfect_hash_params(keys, name):
+    if os.environ.get('GRPC_GEN_STATIC_METADATA_CACHE') != '1':
+        return search_perfect_hash_params(keys, name)
+    digest = hashlib.sha256(
+        repr((PERFECT_HASH_CACHE_VERSION, keys)).encode('utf-8')).hexdigest()
+    cache_path = os.path.join(tempfile.gettempdir(),
+                              'grpc_static_mphf_%s.json' % digest)
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            params = json.load(f)
+        if valid_perfect_hash_params(keys, name, params):
+            return params
+    except (OSError, ValueError):
+        pass
+    params = search_perfect_hash_params(keys, name)
+    # write to a temporary file and rename it into place, so that concurrent
+    # runs never see a partially written cache entry
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+    except OSError:
+        return params
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(params, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return params
 
 
 def perfect_hash(keys, name):
-    p = perfection.hash_parameters(keys)
-
-    def f(i, p=p):
-        i += p.offset
-        x = i % p.t
-        y = i / p.t
-        return x + p.r[y]
+    n = len(keys)
+    params = cached_perfect_hash_params(keys, name)
+    pilots = params['pilots']
+    f = perfect_hash_func(params, n)
 
     return {
         'PHASHNKEYS':
-            len(p.slots),
+            n,
         'pyfunc':
             f,
         'code':
             """
-static const int8_t %(name)s_r[] = {%(r)s};
+static const uint%(pilot_bits)d_t %(name)s_pilots[] = {%(pilots)s};
 static uint32_t %(name)s_phash(uint32_t i) {
-  i %(offset_sign)s= %(offset)d;
-  uint32_t x = i %% %(t)d;
-  uint32_t y = i / %(t)d;
-  uint32_t h = x;
-  if (y < GPR_ARRAY_SIZE(%(name)s_r)) {
-    uint32_t delta = static_cast<uint32_t>(%(name)s_r[y]);
-    h += delta;
-  }
-  return h;
+  uint32_t x = i * 0x%(seed)08Xu;
+  return (x ^ %(name)s_pilots[x >> %(shift)d]) %% %(n)d;
 }
     """ % {
                 'name': name,
-                'r': ','.join('%d' % (r if r is not None else 0) for r in p.r),
-                't': p.t,
-                'offset': abs(p.offset),
-                'offset_sign': '+' if p.offset > 0 else '-'
+                'pilot_bits': 8 if max(pilots) < 256 else 16,
+                'pilots': ','.join(map(str, pilots)),
+                'seed': params['seed'],
+                'shift': 32 - params['bucket_bits'],
+                'n': n
             }
     }
 
 
+# elements with an empty value (most of the hpack static table) are looked up
+# directly by the index of their key string, all others through a perfect hash
+assert len(all_elems) < 255
+assert '' in str_to_idx, 'the empty string must be a static metadata string'
+empty_str_idx = str_idx('')
+empty_value_elem_idxs = [255] * len(all_strs)
+hashed_elem_idxs = []
+for i, elem in enumerate(all_elems):
+    if str_idx(elem[1]) == empty_str_idx:
+        empty_value_elem_idxs[str_idx(elem[0])] = i
+    else:
+        hashed_elem_idxs.append(i)
+assert hashed_elem_idxs, ('at least one static mdelem must have a non-empty '
+                          'value to build the elems perfect hash')
+emit(
+    C, 'static const uint8_t empty_value_elem_idxs[] = {%s};' %
+    ','.join(BYTE_STR[i] for i in empty_value_elem_idxs))
+
 elem_keys = [
-    str_idx(elem[0]) * len(all_strs) + str_idx(elem[1]) for elem in all_elems
+    str_idx(all_elems[i][0]) * len(all_strs) + str_idx(all_elems[i][1])
+    for i in hashed_elem_idxs
 ]
 elem_hash = perfect_hash(elem_keys, 'elems')
-print >> C, elem_hash['code']
-
-keys = [0] * int(elem_hash['PHASHNKEYS'])
-idxs = [255] * int(elem_hash['PHASHNKEYS'])
-for i, k in enumerate(elem_keys):
-    h = elem_hash['pyfunc'](k)
-    assert keys[h] == 0
-    keys[h] = k
-    idxs[h] = i
-print >> C, 'static const uint16_t elem_keys[] = {%s};' % ','.join(
-    '%d' % k for k in keys)
-print >> C, 'static const uint8_t elem_idxs[] = {%s};' % ','.join(
-    '%d' % i for i in idxs)
-print >> C
-
-print >> H, 'grpc_mdelem grpc_static_mdelem_for_static_strings(intptr_t a, intptr_t b);'
-print >> C, 'grpc_mdelem grpc_static_mdelem_for_static_strings(intptr_t a, intptr_t b) {'
-print >> C, '  if (a == -1 || b == -1) return GRPC_MDNULL;'
-print >> C, '  uint32_t k = static_cast<uint32_t>(a * %d + b);' % len(all_strs)
-print >> C, '  uint32_t h = elems_phash(k);'
-print >> C, '  return h < GPR_ARRAY_SIZE(elem_keys) && elem_keys[h] == k && elem_idxs[h] != 255 ? GRPC_MAKE_MDELEM(&grpc_static_mdelem_table()[elem_idxs[h]].data(), GRPC_MDELEM_STORAGE_STATIC) : GRPC_MDNULL;'
-print >> C, '}'
-print >> C
-
-print >> H, 'typedef enum {'
+emit(C, elem_hash['code'])
+
+keys = [0] * elem_hash['PHASHNKEYS']
+idxs = [255] * elem_hash['PHASHNKEYS']
+for i, h in enumerate(map(elem_hash['pyfunc'], elem_keys)):
+    assert idxs[h] == 255
+    keys[h] = elem_keys[i]
+    idxs[h] = hashed_elem_idxs[i]
+emit(C, 'static const uint16_t elem_keys[] = {%s};' % ','.join(map(str, keys)))
+emit(
+    C, 'static const uint8_t elem_idxs[] = {%s};' %
+    ','.join(BYTE_STR[i] for i in idxs))
+emit(C)
+
+emit(
+    H,
+    'grpc_mdelem grpc_static_mdelem_for_static_strings(intptr_t a, intptr_t b);'
+)
+emit(
+    C,
+    'grpc_mdelem grpc_static_mdelem_for_static_strings(intptr_t a, intptr_t b) {'
+)
+emit(C, '  if (a == -1 || b == -1) return GRPC_MDNULL;')
+emit(C, '  uint8_t idx;')
+emit(C, '  if (b == %d) {' % empty_str_idx)
+emit(C, '    idx = empty_value_elem_idxs[a];')
+emit(C, '  } else {')
+emit(C, '    uint32_t k = static_cast<uint32_t>(a * %d + b);' % len(all_strs))
+emit(C, '    uint32_t h = elems_phash(k);')
+emit(C, '    idx = elem_keys[h] == k ? elem_idxs[h] : 255;')
+emit(C, '  }')
+emit(
+    C,
+    '  return idx != 255 ? GRPC_MAKE_MDELEM(&grpc_static_mdelem_table()[idx].data(), GRPC_MDELEM_STORAGE_STATIC) : GRPC_MDNULL;'
+)
+emit(C, '}')
+emit(C)
+
+emit(H, 'typedef enum {')
 for elem in METADATA_BATCH_CALLOUTS:
-    print >> H, '  %s,' % mangle(elem, 'batch').upper()
-print >> H, '  GRPC_BATCH_CALLOUTS_COUNT'
-print >> H, '} grpc_metadata_batch_callouts_index;'
-print >> H
-print >> H, 'typedef union {'
-print >> H, '  struct grpc_linked_mdelem *array[GRPC_BATCH_CALLOUTS_COUNT];'
-print >> H, '  struct {'
+    emit(H, '  %s,' % mangle(elem, 'batch').upper())
+emit(H, '  GRPC_BATCH_CALLOUTS_COUNT')
+emit(H, '} grpc_metadata_batch_callouts_index;')
+emit(H)
+emit(H, 'typedef union {')
+emit(H, '  struct grpc_linked_mdelem *array[GRPC_BATCH_CALLOUTS_COUNT];')
+emit(H, '  struct {')
 for elem in METADATA_BATCH_CALLOUTS:
-    print >> H, '  struct grpc_linked_mdelem *%s;' % mangle(elem, '').lower()
-print >> H, '  } named;'
-print >> H, '} grpc_metadata_batch_callouts;'
-print >> H
+    emit(H, '  struct grpc_linked_mdelem *%s;' % mangle(elem, '').lower())
+emit(H, '  } named;')
+emit(H, '} grpc_metadata_batch_callouts;')
+emit(H)
 
 batch_idx_of_hdr = '#define GRPC_BATCH_INDEX_OF(slice) \\'
 static_slice = 'GRPC_IS_STATIC_METADATA_STRING((slice))'
@@ -714,31 +856,56 @@ batch_idx_of_pieces = [
     batch_invalid_u32, '?', slice_ref_idx_to_batch_idx, ':', batch_invalid_idx,
     ')'
 ]
-print >> H, ''.join(batch_idx_of_pieces)
-print >> H
-
-print >> H, 'extern const uint8_t grpc_static_accept_encoding_metadata[%d];' % (
-    1 << len(COMPRESSION_ALGORITHMS))
-print >> C, 'const uint8_t grpc_static_accept_encoding_metadata[%d] = {' % (
-    1 << len(COMPRESSION_ALGORITHMS))
-print >> C, '0,%s' % ','.join('%d' % md_idx(elem) for elem in compression_elems)
-print >> C, '};'
-print >> C
-
-print >> H, '#define GRPC_MDELEM_ACCEPT_ENCODING_FOR_ALGORITHMS(algs) (GRPC_MAKE_MDELEM(&grpc_static_mdelem_table()[grpc_static_accept_encoding_metadata[(algs)]].data(), GRPC_MDELEM_STORAGE_STATIC))'
-print >> H
-
-print >> H, 'extern const uint8_t grpc_static_accept_stream_encoding_metadata[%d];' % (
-    1 << len(STREAM_COMPRESSION_ALGORITHMS))
-print >> C, 'const uint8_t grpc_static_accept_stream_encoding_metadata[%d] = {' % (
-    1 << len(STREAM_COMPRESSION_ALGORITHMS))
-print >> C, '0,%s' % ','.join(
-    '%d' % md_idx(elem) for elem in stream_compression_elems)
-print >> C, '};'
-
-print >> H, '#define GRPC_MDELEM_ACCEPT_STREAM_ENCODING_FOR_ALGORITHMS(algs) (GRPC_MAKE_MDELEM(&grpc_static_mdelem_table()[grpc_static_accept_stream_encoding_metadata[(algs)]].data(), GRPC_MDELEM_STORAGE_STATIC))'
-
-print >> H, '#endif /* GRPC_CORE_LIB_TRANSPORT_STATIC_METADATA_H */'
-
-H.close()
-C.close()
+emit(H, ''.join(batch_idx_of_pieces))
+emit(H)
+
+emit(
+    H, 'extern const uint8_t grpc_static_accept_encoding_metadata[%d];' %
+    (1 << len(COMPRESSION_ALGORITHMS)))
+emit(
+    C, 'const uint8_t grpc_static_accept_encoding_metadata[%d] = {' %
+    (1 << len(COMPRESSION_ALGORITHMS)))
+emit(C, '0,%s' % ','.join('%d' % md_idx(elem) for elem in compression_elems))
+emit(C, '};')
+emit(C)
+
+emit(
+    H,
+    '#define GRPC_MDELEM_ACCEPT_ENCODING_FOR_ALGORITHMS(algs) (GRPC_MAKE_MDELEM(&grpc_static_mdelem_table()[grpc_static_accept_encoding_metadata[(algs)]].data(), GRPC_MDELEM_STORAGE_STATIC))'
+)
+emit(H)
+
+emit(
+    H, 'extern const uint8_t grpc_static_accept_stream_encoding_metadata[%d];' %
+    (1 << len(STREAM_COMPRESSION_ALGORITHMS)))
+emit(
+    C, 'const uint8_t grpc_static_accept_stream_encoding_metadata[%d] = {' %
+    (1 << len(STREAM_COMPRESSION_ALGORITHMS)))
+emit(
+    C,
+    '0,%s' % ','.join('%d' % md_idx(elem) for elem in stream_compression_elems))
+emit(C, '};')
+
+emit(
+    H,
+    '#define GRPC_MDELEM_ACCEPT_STREAM_ENCODING_FOR_ALGORITHMS(algs) (GRPC_MAKE_MDELEM(&grpc_static_mdelem_table()[grpc_static_accept_stream_encoding_metadata[(algs)]].data(), GRPC_MDELEM_STORAGE_STATIC))'
+)
+
+emit(H, '#endif /* GRPC_CORE_LIB_TRANSPORT_STATIC_METADATA_H */')
+
+
+def write_output(buf, arg, path):
+    if args:
+        if arg in args:
+            sys.stdout.write(''.join(buf))
+    else:
+        with open(os.path.join(os.path.dirname(sys.argv[0]), path),
+                  'w',
+                  encoding='utf-8') as f:
+            f.write(''.join(buf))
+
+
+write_output(H, 'header', '../../../src/core/lib/transport/static_metadata.h')
+write_output(C, 'source', '../../../src/core/lib/transport/static_metadata.cc')
+write_output(D, 'dictionary',
+             '../../../test/core/end2end/fuzzers/hpack.dictionary')